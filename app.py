@@ -3,6 +3,7 @@ import sqlite3
 import datetime
 import ast
 from pinger import Logger
+from reports import build_sla_report
 
 app = Flask(__name__)
 logger = Logger()
@@ -360,5 +361,35 @@ def export_data():
         return response
 
 
+@app.route('/api/reports/sla', methods=['GET'])
+def get_sla_report():
+    """
+    Monthly SLA metrics (availability, packet loss, average and p95 latency,
+    minutes per latency band) computed from the precomputed rollups.
+    'start' and 'end' are months in YYYY-MM format and default to the
+    current month.
+    """
+    partner = request.args.get('partner')
+    country = request.args.get('country')
+    group_by = request.args.get('by', 'trunk')
+
+    now = datetime.datetime.now()
+    try:
+        start = datetime.datetime.strptime(request.args.get('start', now.strftime('%Y-%m')), '%Y-%m')
+        end = datetime.datetime.strptime(request.args.get('end', now.strftime('%Y-%m')), '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
+
+    if start > end:
+        return jsonify({'error': 'Invalid time range'}), 400
+
+    try:
+        report = build_sla_report(start, end, partner, country, group_by)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(report)
+
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -7,10 +7,14 @@ import os
 import sys
 import traceback
 import time
+import re
+import math
+from array import array
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from pathlib import Path
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional, Dict, Any
 
 
@@ -20,6 +24,11 @@ with open('config.json', 'r') as fh:
 conn_timeout = 5
 conn = sqlite3.connect(config['database_path'], timeout=conn_timeout)
 
+# Per-packet RTTs are stored as little-endian float32, one value per
+# echo request in sequence order, with NaN marking lost packets
+RTT_TYPECODE = 'f'
+RTT_DTYPE = '<f4'
+
 
 class Logger:
     def __init__(self):
@@ -148,6 +157,18 @@ def init_database() -> None:
             ON ping_results(server_ip, timestamp)
         ''')
 
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_timestamp
+            ON ping_results(timestamp)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ping_rtts (
+                result_id INTEGER PRIMARY KEY REFERENCES ping_results(id),
+                rtts BLOB NOT NULL
+            )
+        ''')
+
         conn.commit()
         logger.log("Database initialized successfully", 'INFO', 'DB_INIT')
         
@@ -169,6 +190,15 @@ class PingStats:
     max_time: Optional[float]
     mdev_time: Optional[float]
 
+def encode_rtts(rtts: List[Optional[float]]) -> bytes:
+    """
+    Pack per-packet RTTs into a float32 blob, lost packets become NaN
+    """
+    packed = array(RTT_TYPECODE, [math.nan if rtt is None else rtt for rtt in rtts])
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
 class Server:
     def __init__(self, server_info: Dict) -> None:
         self.partner = server_info['partner']
@@ -177,16 +207,25 @@ class Server:
         self.dn_ext = server_info['dn_ext']
         self.os_params = config['windows_params'] if platform.system().lower() == 'windows' else config['unix_params']
         self.thresholds = config['latency_thresholds']
+        self.capture_rtts = config.get('rtt_capture', {}).get('enabled', False)
 
     def run_ping_tests(self) -> None:
         """
         Run ping tests for configured servers
         """
         current_time = datetime.now()
+        stats = self.ping(self.ip)
+        self.store_results(stats, current_time)
+
+    def store_results(self, stats: Dict, current_time: datetime) -> Optional[Dict]:
+        """
+        Analyze ping statistics and store them in the database
+        Returns the latency analysis, or None if the results could not be stored
+        """
         cursor = conn.cursor()
+        latency_stats = None
 
         try:
-            stats = self.ping(self.ip)
             latency_stats = self.analyze_latency(stats)
             
             cursor.execute('''
@@ -206,19 +245,25 @@ class Server:
                 stats['success'], str(latency_stats['concerns'])
             ))
 
+            if self.capture_rtts and stats.get('rtts'):
+                cursor.execute('''
+                    INSERT INTO ping_rtts (result_id, rtts) VALUES (?, ?)
+                ''', (cursor.lastrowid, encode_rtts(stats['rtts'])))
+
             # logger.log(f"Ping test completed for {self.ip}", "INFO", "PING")
         except Exception as e:
             logger.log(f"Error storing ping results for {self.ip}: {e}", "ERROR", "PING", sys.exc_info())
 
         conn.commit()
+        return latency_stats
 
-    def ping(self, host: str) -> Dict:
+    def ping(self, host: str, count: Optional[int] = None) -> Dict:
         """
         Ping a host and return comprehensive statistics
         Returns a dictionary with all ping statistics
         """
         count_param = self.os_params['count_param']
-        count = str(config['ping_count'])
+        count = str(count or config['ping_count'])
         
         timeout_param = self.os_params['timeout_param']
         timeout_value = str(config['ping_timeout'])
@@ -228,13 +273,15 @@ class Server:
         command = ['ping', count_param, count, timeout_param, timeout_value, host]
         
         try:
-            output = subprocess.check_output(command, timeout=config['ping_timeout'] + 1).decode('utf-8')
+            # Replies are one second apart, so allow for the whole run
+            output = subprocess.check_output(command, timeout=config['ping_timeout'] + int(count)).decode('utf-8')
             stats = self._parse_ping_output(output)
-            logger.log(f"Ping statistics for {host}: {stats}", "INFO", "PING")
+            summary = {key: value for key, value in stats.items() if key != 'rtts'}
+            logger.log(f"Ping statistics for {host}: {summary}", "INFO", "PING")
             return stats
         except Exception as e:
             logger.log(f"Error pinging {host}: {e}", "ERROR", "PING", sys.exc_info())
-            return {
+            stats = {
                 'packets_transmitted': 0,
                 'packets_received': 0,
                 'packets_lost': 0,
@@ -246,6 +293,17 @@ class Server:
                 'success': False
             }
 
+            # ping exits non-zero when no reply came back, keep what it reported
+            if isinstance(e, subprocess.CalledProcessError) and e.output:
+                try:
+                    stats.update(self._parse_ping_output(e.output.decode('utf-8')))
+                except Exception as parse_error:
+                    logger.log(f"Error parsing ping output for {host}: {parse_error}", "ERROR", "PING", sys.exc_info())
+
+            # Every echo request that was sent is captured, lost ones as NaN
+            stats['rtts'] = stats.get('rtts') or [None] * stats['packets_transmitted']
+            return stats
+
     def _parse_ping_output(self, output: str) -> Dict:
         """
         Parse ping command output and extract all statistics
@@ -261,9 +319,17 @@ class Server:
         Parse Windows ping command output
         """
         stats = {}
+        rtts = []
         
         # Parse packets sent/received
         for line in output.splitlines():
+            # Replies are printed in order, "time<1ms" is recorded as 1ms
+            reply = re.search(r'time[=<]([\d.]+)ms', line)
+            if reply and "Reply from" in line:
+                rtts.append(float(reply.group(1)))
+            elif "Reply from" in line or "Request timed out" in line or "General failure" in line:
+                rtts.append(None)
+
             if "Packets: Sent =" in line:
                 parts = line.split(",")
                 stats['packets_transmitted'] = int(parts[0].split("=")[1].strip())
@@ -278,6 +344,8 @@ class Server:
                 stats['max_time'] = float(parts[1].split("=")[1].strip())
                 stats['mdev_time'] = None  # Windows doesn't provide standard deviation
         
+        transmitted = stats.get('packets_transmitted', len(rtts))
+        stats['rtts'] = (rtts + [None] * transmitted)[:transmitted]
         stats['success'] = stats.get('packets_received', 0) > 0
         return stats
 
@@ -286,9 +354,15 @@ class Server:
         Parse Unix-like ping command output
         """
         stats = {}
+        replies = {}
         
         # Parse packet statistics
         for line in output.splitlines():
+            # Format: 64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=8.16 ms
+            reply = re.search(r'icmp_seq=(\d+).*time[=<]([\d.]+)', line)
+            if reply and "DUP!" not in line:
+                replies[int(reply.group(1))] = float(reply.group(2))
+
             if "packets transmitted" in line:
                 parts = line.split(",")
                 stats['packets_transmitted'] = int(parts[0].split()[0])
@@ -304,6 +378,10 @@ class Server:
                 stats['max_time'] = float(times[2])
                 stats['mdev_time'] = float(times[3].split()[0])  # Remove 'ms' unit
         
+        # Sequence numbers start at 0 on macOS/BSD and at 1 on Linux, missing ones were lost
+        first_seq = 0 if platform.system().lower() == 'darwin' else 1
+        transmitted = stats.get('packets_transmitted', 0)
+        stats['rtts'] = [replies.get(first_seq + index) for index in range(transmitted)]
         stats['success'] = stats.get('packets_received', 0) > 0
         return stats
         
@@ -330,7 +408,7 @@ class Server:
             status = 'critical'
 
         if avg_time > self.thresholds['fair']:
-            logger.log(f'{ping_stats["country"]}: High Latency ({avg_time})', 'WARNING', 'LATENCY_ANALYZER')
+            logger.log(f'{self.country}: High Latency ({avg_time})', 'WARNING', 'LATENCY_ANALYZER')
 
         result = {
             'status': status,
@@ -352,6 +430,173 @@ class Server:
         result['concerns'] = concerns
         return result
 
+@dataclass
+class TrunkState:
+    interval: float
+    count: int
+    next_due: float
+    last_probe: float
+    degraded: bool = False
+    healthy_streak: int = 0
+
+class ProbeBudget:
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Token bucket limiting the number of echo requests sent per second
+        across all trunks.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, probes: int) -> bool:
+        self._refill()
+        if self.tokens < probes:
+            return False
+        self.tokens -= probes
+        return True
+
+    def wait_time(self, probes: int) -> float:
+        self._refill()
+        return max(0.0, (probes - self.tokens) / self.rate)
+
+class AdaptiveScheduler:
+    def __init__(self, servers: List[Server]) -> None:
+        """
+        Probe servers on an adaptive cadence within a global probe budget.
+        Stable servers gradually back off to max_interval, degraded servers
+        are probed every degraded_interval seconds with degraded_ping_count
+        packets until they have been healthy for recovery_probes probes.
+        Servers not probed for starved_after seconds go first, smallest probe
+        first, so degraded servers cannot starve stable ones of the budget.
+        """
+        settings = config['adaptive_probing']
+        self.servers = servers
+        self.base_interval = settings.get('base_interval', 60)
+        self.max_interval = settings.get('max_interval', 240)
+        self.backoff_factor = settings.get('backoff_factor', 1.5)
+        self.degraded_interval = settings.get('degraded_interval', 10)
+        self.degraded_count = settings.get('degraded_ping_count', 20)
+        self.recovery_probes = settings.get('recovery_probes', 3)
+        self.max_workers = settings.get('max_workers', 8)
+        # Just under the dashboard's 300 second stale window
+        self.starved_after = settings.get('starved_after', 270)
+
+        max_pps = settings.get('max_probes_per_second', 20)
+        self.budget = ProbeBudget(max_pps, max(max_pps, self.degraded_count, config['ping_count']))
+
+        now = time.monotonic()
+        self.states = {
+            server.ip: TrunkState(interval=self.base_interval, count=config['ping_count'], next_due=now, last_probe=now)
+            for server in servers
+        }
+
+    def _is_healthy(self, stats: Dict, latency_stats: Optional[Dict]) -> bool:
+        if not stats['success'] or latency_stats is None:
+            return False
+        return not latency_stats.get('is_high_latency') and not latency_stats.get('concerns')
+
+    def _update_state(self, server: Server, healthy: bool) -> None:
+        state = self.states[server.ip]
+
+        if not healthy:
+            if not state.degraded:
+                logger.log(f'{server.country}: Degraded, increasing probe rate', 'WARNING', 'SCHEDULER')
+            state.degraded = True
+            state.healthy_streak = 0
+            state.interval = self.degraded_interval
+            state.count = self.degraded_count
+        else:
+            state.healthy_streak += 1
+            if state.degraded:
+                if state.healthy_streak >= self.recovery_probes:
+                    logger.log(f'{server.country}: Recovered, restoring probe rate', 'INFO', 'SCHEDULER')
+                    state.degraded = False
+                    state.interval = self.base_interval
+                    state.count = config['ping_count']
+            else:
+                state.interval = min(state.interval * self.backoff_factor, self.max_interval)
+
+        state.next_due = time.monotonic() + state.interval
+
+    def _next_server(self, busy: set) -> Optional[Server]:
+        """
+        Return the server that should be probed next: servers not probed for
+        starved_after seconds first (smallest probe, then longest waiting),
+        then degraded servers, then the one that has been due the longest
+        """
+        now = time.monotonic()
+        due = [
+            server for server in self.servers
+            if server.ip not in busy and self.states[server.ip].next_due <= now
+        ]
+        if not due:
+            return None
+
+        def priority(server: Server):
+            state = self.states[server.ip]
+            if now - state.last_probe >= self.starved_after:
+                return (0, state.count, state.last_probe)
+            return (1, not state.degraded, state.next_due)
+
+        return min(due, key=priority)
+
+    def _sleep_time(self, pending: Dict) -> Optional[float]:
+        """
+        Seconds until the next probe can be sent, or None to wait for a running probe
+        """
+        if not self.servers:
+            return self.base_interval
+
+        busy = {server.ip for server, _ in pending.values()}
+        if len(pending) >= self.max_workers or len(busy) == len(self.servers):
+            return None
+
+        server = self._next_server(busy)
+        if server is not None:
+            return self.budget.wait_time(self.states[server.ip].count)
+
+        idle = [state for ip, state in self.states.items() if ip not in busy]
+        return max(0.0, min(state.next_due for state in idle) - time.monotonic())
+
+    def run(self) -> None:
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                timeout = self._sleep_time(pending)
+                if pending:
+                    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    # wait() returns at once when there is nothing to wait for
+                    time.sleep(timeout)
+                    done = set()
+
+                for future in done:
+                    server, current_time = pending.pop(future)
+                    stats = future.result()
+                    latency_stats = server.store_results(stats, current_time)
+                    self._update_state(server, self._is_healthy(stats, latency_stats))
+
+                while len(pending) < self.max_workers:
+                    server = self._next_server({server.ip for server, _ in pending.values()})
+                    if server is None:
+                        break
+
+                    state = self.states[server.ip]
+                    if not self.budget.take(state.count):
+                        break
+
+                    state.last_probe = time.monotonic()
+                    future = executor.submit(server.ping, server.ip, state.count)
+                    pending[future] = (server, datetime.now())
+
 def check_alert_conditions(self, stats: Dict) -> List[str]:
     """
     Check if current conditions warrant alerts
@@ -373,9 +618,12 @@ def check_alert_conditions(self, stats: Dict) -> List[str]:
 
 if __name__ == "__main__":
     server_instances = [Server(server) for server in config['servers']]
-    
-    while True:
-        for server in server_instances:
-            server.run_ping_tests()
-        
-        time.sleep(60)
\ No newline at end of file
+
+    if config.get('adaptive_probing', {}).get('enabled'):
+        AdaptiveScheduler(server_instances).run()
+    else:
+        while True:
+            for server in server_instances:
+                server.run_ping_tests()
+
+            time.sleep(60)
\ No newline at end of file
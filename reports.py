@@ -0,0 +1,422 @@
+import sqlite3
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+
+from pinger import config, logger, conn_timeout
+
+
+# Latency histogram used to estimate percentiles from rollups (ms per bin).
+# Bins above HISTOGRAM_MAX_BIN are folded into the last bin.
+HISTOGRAM_BIN_MS = 5
+HISTOGRAM_MAX_BIN = 400
+
+# A probe is assumed to describe the link until the next probe arrives,
+# capped so that gaps in the data stream are not credited to any band.
+# Matches the 300 second staleness window used by the dashboard.
+MAX_PROBE_SECONDS = 300
+
+# An hour is only rolled up once every probe that can still describe it
+# has been stored, so a probe's duration never depends on when the job ran.
+# The extra margin covers probes that have started but are still pinging.
+ROLLUP_DELAY = timedelta(seconds=MAX_PROBE_SECONDS + 120)
+
+BANDS = ['excellent', 'good', 'fair', 'poor', 'critical', 'failed']
+
+ROLLUP_COLUMNS = [
+    'probes', 'successes', 'packets_transmitted', 'packets_received',
+    'latency_sum', 'latency_count'
+] + [f'seconds_{band}' for band in BANDS]
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _create_rollups_table(conn: sqlite3.Connection) -> None:
+    """
+    Create the rollup table used by the SLA reports.
+    Rows are only written for completed periods and never updated.
+    Only the rollup job creates it, so the web app never writes the schema.
+    """
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS ping_rollups (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            server_ip TEXT NOT NULL,
+            country TEXT NOT NULL,
+            partner TEXT NOT NULL,
+            {', '.join(f'{column} REAL NOT NULL' for column in ROLLUP_COLUMNS)},
+            histogram TEXT NOT NULL,
+            PRIMARY KEY (granularity, bucket, server_ip)
+        )
+    ''')
+
+def _has_rollups_table(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ping_rollups'"
+    ).fetchone() is not None
+
+
+def _hour_start(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _next_month(value: datetime) -> datetime:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def _merge_histograms(target: Dict[str, int], source: Dict[str, int]) -> None:
+    for bin_index, count in source.items():
+        target[bin_index] = target.get(bin_index, 0) + count
+
+
+def _rollup_hours(conn: sqlite3.Connection, start: datetime, end: datetime) -> List[Dict]:
+    """
+    Aggregate raw ping results in [start, end) into one row per trunk and hour.
+    Each probe covers the time until the next probe (at most MAX_PROBE_SECONDS);
+    time running past the end of its hour is credited to the following hour.
+    """
+    thresholds = config['latency_thresholds']
+    probes = f'''
+        WITH probes AS (
+            SELECT
+                server_ip, country, partner, timestamp, success,
+                packets_transmitted, packets_received, avg_time,
+                strftime('%Y-%m-%d %H:00:00', timestamp) AS bucket,
+                CASE
+                    WHEN NOT success THEN 'failed'
+                    WHEN avg_time <= :excellent THEN 'excellent'
+                    WHEN avg_time <= :good THEN 'good'
+                    WHEN avg_time <= :fair THEN 'fair'
+                    WHEN avg_time <= :poor THEN 'poor'
+                    ELSE 'critical'
+                END AS band,
+                MIN(COALESCE(
+                    (julianday(LEAD(timestamp) OVER (PARTITION BY server_ip ORDER BY timestamp))
+                     - julianday(timestamp)) * 86400,
+                    {MAX_PROBE_SECONDS}
+                ), {MAX_PROBE_SECONDS}) AS seconds,
+                (julianday(strftime('%Y-%m-%d %H:00:00', timestamp, '+1 hour'))
+                 - julianday(timestamp)) * 86400 AS seconds_left
+            FROM ping_results
+            WHERE timestamp >= :window_start
+        ),
+        spans AS (
+            SELECT server_ip, country, partner, bucket, band, MIN(seconds, seconds_left) AS seconds
+            FROM probes
+            WHERE timestamp >= :start AND timestamp < :end
+            UNION ALL
+            SELECT
+                server_ip, country, partner,
+                strftime('%Y-%m-%d %H:00:00', bucket, '+1 hour') AS bucket,
+                band, seconds - seconds_left AS seconds
+            FROM probes
+            WHERE seconds > seconds_left
+        )
+    '''
+    params = {
+        'window_start': (start - timedelta(seconds=MAX_PROBE_SECONDS)).strftime(TIME_FORMAT),
+        'start': start.strftime(TIME_FORMAT),
+        'end': end.strftime(TIME_FORMAT),
+        'excellent': thresholds['excellent'],
+        'good': thresholds['good'],
+        'fair': thresholds['fair'],
+        'poor': thresholds['poor'],
+    }
+
+    cursor = conn.cursor()
+    cursor.execute(probes + f'''
+        SELECT
+            bucket, server_ip, MAX(country), MAX(partner),
+            {', '.join(f"SUM(CASE WHEN band = '{band}' THEN seconds ELSE 0 END)" for band in BANDS)}
+        FROM spans
+        WHERE bucket >= :start AND bucket < :end
+        GROUP BY bucket, server_ip
+    ''', params)
+
+    rollups = {}
+    for row in cursor.fetchall():
+        bucket, server_ip, country, partner = row[:4]
+        rollups[(bucket, server_ip)] = {
+            'bucket': bucket,
+            'server_ip': server_ip,
+            'country': country,
+            'partner': partner,
+            **{column: 0 for column in ROLLUP_COLUMNS},
+            **{f'seconds_{band}': seconds for band, seconds in zip(BANDS, row[4:])},
+            'histogram': {}
+        }
+
+    cursor.execute(probes + '''
+        SELECT
+            bucket, server_ip,
+            COUNT(*),
+            SUM(success),
+            SUM(packets_transmitted),
+            SUM(packets_received),
+            SUM(CASE WHEN success THEN avg_time ELSE 0 END),
+            SUM(success)
+        FROM probes
+        WHERE timestamp >= :start AND timestamp < :end
+        GROUP BY bucket, server_ip
+    ''', params)
+
+    for row in cursor.fetchall():
+        rollups[(row[0], row[1])].update(zip(ROLLUP_COLUMNS, row[2:]))
+
+    cursor.execute(probes + f'''
+        SELECT
+            bucket, server_ip,
+            MIN(CAST(avg_time / {HISTOGRAM_BIN_MS} AS INTEGER), {HISTOGRAM_MAX_BIN}) AS bin,
+            COUNT(*)
+        FROM probes
+        WHERE timestamp >= :start AND timestamp < :end AND success
+        GROUP BY bucket, server_ip, bin
+    ''', params)
+
+    for bucket, server_ip, bin_index, count in cursor.fetchall():
+        rollups[(bucket, server_ip)]['histogram'][str(bin_index)] = count
+
+    return list(rollups.values())
+
+
+def _merge_rollups(rows: List[Dict], key_fn) -> Dict:
+    """
+    Merge rollup rows that share the same key_fn(row) value.
+    """
+    merged = {}
+    for row in rows:
+        key = key_fn(row)
+        if key not in merged:
+            merged[key] = {
+                'server_ip': row['server_ip'],
+                'country': row['country'],
+                'partner': row['partner'],
+                **{column: 0 for column in ROLLUP_COLUMNS},
+                'histogram': {}
+            }
+
+        target = merged[key]
+        for column in ROLLUP_COLUMNS:
+            target[column] += row[column]
+        _merge_histograms(target['histogram'], row['histogram'])
+
+    return merged
+
+
+def _store_rollups(conn: sqlite3.Connection, granularity: str, rows: List[Dict]) -> None:
+    columns = ['granularity', 'bucket', 'server_ip', 'country', 'partner'] + ROLLUP_COLUMNS + ['histogram']
+    conn.executemany(f'''
+        INSERT OR IGNORE INTO ping_rollups ({', '.join(columns)})
+        VALUES ({', '.join(['?'] * len(columns))})
+    ''', [
+        [granularity] + [row[column] for column in columns[1:-1]] + [json.dumps(row['histogram'])]
+        for row in rows
+    ])
+
+
+def _load_rollups(conn: sqlite3.Connection, granularity: str, start: str, end: str,
+                  partner: Optional[str] = None, country: Optional[str] = None) -> List[Dict]:
+    query = f'''
+        SELECT bucket, server_ip, country, partner, {', '.join(ROLLUP_COLUMNS)}, histogram
+        FROM ping_rollups
+        WHERE granularity = ? AND bucket >= ? AND bucket < ?
+    '''
+    params = [granularity, start, end]
+
+    if partner:
+        query += " AND partner = ?"
+        params.append(partner)
+
+    if country:
+        query += " AND country = ?"
+        params.append(country)
+
+    rows = []
+    for row in conn.execute(query, params):
+        bucket, server_ip, row_country, row_partner = row[:4]
+        rows.append({
+            'bucket': bucket,
+            'server_ip': server_ip,
+            'country': row_country,
+            'partner': row_partner,
+            **dict(zip(ROLLUP_COLUMNS, row[4:-1])),
+            'histogram': json.loads(row[-1])
+        })
+    return rows
+
+
+def _last_bucket(conn: sqlite3.Connection, granularity: str) -> Optional[datetime]:
+    row = conn.execute(
+        "SELECT MAX(bucket) FROM ping_rollups WHERE granularity = ?", (granularity,)
+    ).fetchone()
+    return datetime.strptime(row[0], TIME_FORMAT) if row[0] else None
+
+
+def _first_bucket(conn: sqlite3.Connection, granularity: str) -> Optional[datetime]:
+    row = conn.execute(
+        "SELECT MIN(bucket) FROM ping_rollups WHERE granularity = ?", (granularity,)
+    ).fetchone()
+    return datetime.strptime(row[0], TIME_FORMAT).replace(hour=0) if row[0] else None
+
+
+def run_rollups(now: Optional[datetime] = None) -> None:
+    """
+    Roll raw ping results up into hourly, daily and monthly aggregates.
+    Only periods that ended at least ROLLUP_DELAY ago are rolled up, so each
+    run picks up where the previous one stopped and existing rows are never
+    rewritten.
+    """
+    now = now or datetime.now()
+    current_hour = _hour_start(now - ROLLUP_DELAY)
+    current_day = current_hour.replace(hour=0)
+    current_month = _month_start(current_hour)
+
+    try:
+        with sqlite3.connect(config['database_path'], timeout=conn_timeout) as conn:
+            _create_rollups_table(conn)
+
+            last_hour = _last_bucket(conn, 'hour')
+            if last_hour:
+                start = last_hour + timedelta(hours=1)
+            else:
+                first = conn.execute("SELECT MIN(timestamp) FROM ping_results").fetchone()[0]
+                if first is None:
+                    return
+                start = _hour_start(datetime.fromisoformat(first))
+
+            if start < current_hour:
+                hours = _rollup_hours(conn, start, current_hour)
+                _store_rollups(conn, 'hour', hours)
+
+            last_day = _last_bucket(conn, 'day')
+            start = last_day + timedelta(days=1) if last_day else _first_bucket(conn, 'hour')
+            if start and start < current_day:
+                hours = _load_rollups(conn, 'hour', start.strftime(TIME_FORMAT), current_day.strftime(TIME_FORMAT))
+                days = _merge_rollups(hours, lambda row: (row['bucket'][:10], row['server_ip']))
+                _store_rollups(conn, 'day', [
+                    {**row, 'bucket': f'{day} 00:00:00'} for (day, _), row in days.items()
+                ])
+
+            last_month = _last_bucket(conn, 'month')
+            start = _next_month(last_month) if last_month else _first_bucket(conn, 'day')
+            if start and _month_start(start) < current_month:
+                days = _load_rollups(conn, 'day', _month_start(start).strftime(TIME_FORMAT),
+                                     current_month.strftime(TIME_FORMAT))
+                months = _merge_rollups(days, lambda row: (row['bucket'][:7], row['server_ip']))
+                _store_rollups(conn, 'month', [
+                    {**row, 'bucket': f'{month}-01 00:00:00'} for (month, _), row in months.items()
+                ])
+
+            conn.commit()
+
+    except Exception as e:
+        logger.log(f"Error rolling up ping results: {e}", "ERROR", "REPORTS", sys.exc_info())
+
+
+def _percentile(histogram: Dict[str, int], percentile: float) -> Optional[float]:
+    """
+    Estimate a latency percentile by interpolating within histogram bins.
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+
+    rank = total * percentile / 100
+    seen = 0
+    for bin_index in sorted(histogram, key=int):
+        count = histogram[bin_index]
+        if seen + count >= rank:
+            fraction = (rank - seen) / count
+            return round((int(bin_index) + fraction) * HISTOGRAM_BIN_MS, 2)
+        seen += count
+    return None
+
+
+def _sla_metrics(rollup: Dict) -> Dict:
+    seconds = sum(rollup[f'seconds_{band}'] for band in BANDS)
+    return {
+        'probes': int(rollup['probes']),
+        'availability': round(100 * (seconds - rollup['seconds_failed']) / seconds, 3) if seconds else None,
+        'packet_loss': round(
+            100 * (1 - rollup['packets_received'] / rollup['packets_transmitted']), 3
+        ) if rollup['packets_transmitted'] else None,
+        'avg_latency': round(rollup['latency_sum'] / rollup['latency_count'], 2) if rollup['latency_count'] else None,
+        'p95_latency': _percentile(rollup['histogram'], 95),
+        'minutes': {band: round(rollup[f'seconds_{band}'] / 60, 1) for band in BANDS}
+    }
+
+
+def build_sla_report(start: datetime, end: datetime,
+                     partner: Optional[str] = None,
+                     country: Optional[str] = None,
+                     by: str = 'trunk') -> List[Dict]:
+    """
+    Build monthly SLA metrics for the months from start to end (inclusive).
+
+    Months are read from their cached monthly rollup. Months that have not
+    been rolled up yet (the current month, or a past month while the rollup
+    job is behind) are assembled from daily and hourly rollups, so the report
+    covers data up to the last rolled up hour.
+
+    Args:
+        start (datetime): Any moment in the first month of the report.
+        end (datetime): Any moment in the last month of the report.
+        partner (str, optional): Filter by partner.
+        country (str, optional): Filter by country.
+        by (str): Group results per 'trunk' (default) or per 'partner'.
+
+    Returns:
+        list: One entry per month and trunk (or partner), ordered by month.
+    """
+    if by not in ('trunk', 'partner'):
+        raise ValueError("Invalid grouping. Must be one of ['trunk', 'partner']")
+
+    first_month = _month_start(start)
+    stop = _next_month(_month_start(end))
+
+    with sqlite3.connect(config['database_path'], timeout=conn_timeout) as conn:
+        if not _has_rollups_table(conn):
+            # The rollup job has not run yet
+            return []
+
+        rows = _load_rollups(conn, 'month', first_month.strftime(TIME_FORMAT),
+                             stop.strftime(TIME_FORMAT), partner, country)
+
+        last_month = _last_bucket(conn, 'month')
+        pending = max(first_month, _next_month(last_month)) if last_month else first_month
+        if pending < stop:
+            # Months without a monthly rollup yet, from daily and then hourly rollups
+            last_day = _last_bucket(conn, 'day')
+            days_end = max(pending, last_day + timedelta(days=1)) if last_day else pending
+            days_end = min(days_end, stop)
+            rows += _load_rollups(conn, 'day', pending.strftime(TIME_FORMAT),
+                                  days_end.strftime(TIME_FORMAT), partner, country)
+            rows += _load_rollups(conn, 'hour', days_end.strftime(TIME_FORMAT),
+                                  stop.strftime(TIME_FORMAT), partner, country)
+
+    group_key = 'server_ip' if by == 'trunk' else 'partner'
+    merged = _merge_rollups(rows, lambda row: (row['bucket'][:7], row[group_key]))
+
+    report = []
+    for (month, _), rollup in sorted(merged.items()):
+        entry = {'month': month, 'partner': rollup['partner']}
+        if by == 'trunk':
+            entry.update({'server_ip': rollup['server_ip'], 'country': rollup['country']})
+        entry.update(_sla_metrics(rollup))
+        report.append(entry)
+
+    return report
+
+
+if __name__ == "__main__":
+    while True:
+        run_rollups()
+        logger.log("Ping result rollups completed", "INFO", "REPORTS")
+
+        # Run once every hour, as soon as the previous hour can be rolled up
+        now = datetime.now()
+        next_run = _hour_start(now - ROLLUP_DELAY) + timedelta(hours=1) + ROLLUP_DELAY
+        time.sleep((next_run - now).total_seconds())
@@ -0,0 +1,81 @@
+import sqlite3
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from pinger import config, conn_timeout, RTT_DTYPE
+
+
+def decode_rtts(blob: bytes) -> np.ndarray:
+    """
+    Decode a per-packet RTT blob into a float32 array, lost packets are NaN.
+    The array is a read-only view on the blob, no data is copied.
+    """
+    return np.frombuffer(blob, dtype=RTT_DTYPE)
+
+
+def iter_rtt_arrays(server_ip: Optional[str] = None,
+                    country: Optional[str] = None,
+                    start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> Iterator[Tuple[str, str, np.ndarray]]:
+    """
+    Stream captured per-packet RTTs probe by probe, oldest first.
+
+    Args:
+        server_ip (str, optional): Filter by server IP.
+        country (str, optional): Filter by country.
+        start (datetime, optional): Only probes at or after this time.
+        end (datetime, optional): Only probes before this time.
+
+    Yields:
+        tuple: (timestamp, server_ip, rtts) where rtts holds one RTT in ms per
+        echo request in sequence order and NaN for every lost packet.
+    """
+    query = '''
+        SELECT r.timestamp, r.server_ip, t.rtts
+        FROM ping_rtts t
+        JOIN ping_results r ON r.id = t.result_id
+        WHERE 1=1
+    '''
+    params = []
+
+    if server_ip:
+        query += " AND r.server_ip = ?"
+        params.append(server_ip)
+
+    if country:
+        query += " AND r.country = ?"
+        params.append(country)
+
+    if start:
+        query += " AND r.timestamp >= ?"
+        params.append(start.strftime("%Y-%m-%d %H:%M:%S"))
+
+    if end:
+        query += " AND r.timestamp < ?"
+        params.append(end.strftime("%Y-%m-%d %H:%M:%S"))
+
+    query += " ORDER BY r.timestamp ASC"
+
+    with sqlite3.connect(config['database_path'], timeout=conn_timeout) as conn:
+        for timestamp, ip, blob in conn.execute(query, params):
+            yield timestamp, ip, decode_rtts(blob)
+
+
+def load_rtts(server_ip: Optional[str] = None,
+              country: Optional[str] = None,
+              start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Load captured RTTs into a single array.
+
+    Returns:
+        tuple: (rtts, offsets) where rtts concatenates every probe in time
+        order and rtts[offsets[i]:offsets[i + 1]] is the i-th probe.
+    """
+    arrays = [rtts for _, _, rtts in iter_rtt_arrays(server_ip, country, start, end)]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(rtts) for rtts in arrays], out=offsets[1:])
+    rtts = np.concatenate(arrays) if arrays else np.empty(0, dtype=RTT_DTYPE)
+    return rtts, offsets
@@ -143,6 +143,25 @@ StandardError=append:$LOG_DIR/pinger.log
 WantedBy=multi-user.target
 EOF
 
+# ccc-sip-monitor-reports.service
+cat > /etc/systemd/system/ccc-sip-monitor-reports.service << EOF
+[Unit]
+Description=CCC SIP Monitor - SLA Report Rollups
+After=network.target
+
+[Service]
+User=$SERVICE_USER
+WorkingDirectory=$INSTALL_DIR
+ExecStart=$VENV_DIR/bin/python reports.py
+Restart=on-failure
+RestartSec=10
+StandardOutput=append:$LOG_DIR/reports.log
+StandardError=append:$LOG_DIR/reports.log
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # 9) Create a desktop shortcut to open the web interface on localhost
 echo ">>> Creating desktop shortcut for the SIP Monitor..."
 mkdir -p "$DESKTOP_DIR"
@@ -183,14 +202,14 @@ echo ">>> PCManFM set to automatically execute scripts."
 if [ -f "$CONFIG_LINK" ]; then
     echo ">>> Enabling and starting services..."
     systemctl daemon-reload
-    systemctl enable ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service
-    systemctl start ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service
+    systemctl enable ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service ccc-sip-monitor-reports.service
+    systemctl start ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service ccc-sip-monitor-reports.service
     echo ">>> Services are now active. Check logs in $LOG_DIR/ or use 'journalctl -u ccc-sip-monitor-...'."
 else
     echo ">>> Config file not found. Services have been created but NOT started."
     echo ">>> Once you have a valid config.json, run:
   sudo systemctl daemon-reload
-  sudo systemctl enable --now ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service
+  sudo systemctl enable --now ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service ccc-sip-monitor-reports.service
 "
 fi
 
@@ -198,6 +217,7 @@ echo ">>> Setup complete!"
 echo "You can check service status with:
   systemctl status ccc-sip-monitor-web.service
   systemctl status ccc-sip-monitor-pinger.service
+  systemctl status ccc-sip-monitor-reports.service
 Logs are stored in: $LOG_DIR/
 Desktop shortcut: $DESKTOP_DIR/SIP-Monitor.desktop
 "
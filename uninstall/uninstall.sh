@@ -47,13 +47,14 @@ fi
 
 # 1) Stop and disable services
 print_message "Stopping and disabling services..."
-systemctl stop ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service 2>/dev/null || true
-systemctl disable ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service 2>/dev/null || true
+systemctl stop ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service ccc-sip-monitor-reports.service 2>/dev/null || true
+systemctl disable ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service ccc-sip-monitor-reports.service 2>/dev/null || true
 
 # 2) Remove systemd service files
 print_message "Removing systemd service files..."
 rm -f /etc/systemd/system/ccc-sip-monitor-web.service
 rm -f /etc/systemd/system/ccc-sip-monitor-pinger.service
+rm -f /etc/systemd/system/ccc-sip-monitor-reports.service
 systemctl daemon-reload
 
 # 3) Remove desktop shortcut
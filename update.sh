@@ -8,13 +8,15 @@
 #   3) Pulling the latest changes from the repository
 #   4) Updating Python dependencies
 #   5) Creating a desktop shortcut (if missing) pointing to localhost
-#   6) Restarting the services
+#   6) Installing the SLA report rollup service (added after first setup)
+#   7) Restarting the services
 # -------------------------------------------------------------------------
 set -e  # Exit on error
 
 # -------------------------- Configuration ---------------------------
 INSTALL_DIR="/opt/ccc-sip-monitor"
 VENV_DIR="$INSTALL_DIR/venv"
+LOG_DIR="/var/log/ccc-sip-monitor"
 LOG_COLOR_BLUE="\e[1;34m"
 LOG_COLOR_RESET="\e[0m"
 # --------------------------------------------------------------------
@@ -50,6 +52,7 @@ fi
 print_message "Stopping services..."
 systemctl stop ccc-sip-monitor-web.service 2>/dev/null || true
 systemctl stop ccc-sip-monitor-pinger.service 2>/dev/null || true
+systemctl stop ccc-sip-monitor-reports.service 2>/dev/null || true
 
 # 3) Update repository
 print_message "Updating repository..."
@@ -93,14 +96,37 @@ EOF
     chown "$SERVICE_USER:$SERVICE_USER" "$DESKTOP_DIR/SIP-Monitor.desktop"
 fi
 
-# 6) Restart services
+# 6) Install the report rollup service (installs set up before it existed lack it)
+print_message "Installing report rollup service..."
+mkdir -p "$LOG_DIR"
+chown "$SERVICE_USER:$SERVICE_USER" "$LOG_DIR"
+cat > /etc/systemd/system/ccc-sip-monitor-reports.service << EOF
+[Unit]
+Description=CCC SIP Monitor - SLA Report Rollups
+After=network.target
+
+[Service]
+User=$SERVICE_USER
+WorkingDirectory=$INSTALL_DIR
+ExecStart=$VENV_DIR/bin/python reports.py
+Restart=on-failure
+RestartSec=10
+StandardOutput=append:$LOG_DIR/reports.log
+StandardError=append:$LOG_DIR/reports.log
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# 7) Restart services
 print_message "Restarting services..."
 systemctl daemon-reload
-systemctl restart ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service
+systemctl enable ccc-sip-monitor-reports.service
+systemctl restart ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service ccc-sip-monitor-reports.service
 
 # Final message
 print_message "Update complete!"
 echo "Web interface is available at: http://localhost:5000 (on the Pi itself)"
 echo "Or use the Pi's IP (e.g., http://<Pi_IP>:5000) from another device."
-echo "Check status with: systemctl status ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service"
+echo "Check status with: systemctl status ccc-sip-monitor-web.service ccc-sip-monitor-pinger.service ccc-sip-monitor-reports.service"
 echo "Desktop shortcut: $DESKTOP_DIR/SIP-Monitor.desktop"